@@ -32,27 +32,73 @@ import json
 import datetime
 import time
 import os
-import dateutil.parser
 import logging
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+
+
+def _cold_init():
+    """
+    One-time setup for the execution environment, run at import during the Lambda init phase.
+    Expensive resources (e.g. boto3 clients for a fulfillment backend) should be created here
+    so they are reused across warm invocations instead of being rebuilt by the handler.
+    """
+    # Log at INFO by default; set the LOG_LEVEL environment variable to DEBUG to trace the dialog.
+    # Unknown level names fall back to INFO rather than failing the cold start.
+    log_level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    logger.setLevel(log_level if isinstance(log_level, int) else logging.INFO)
+
+    # By default, treat the user request as coming from the America/New_York time zone.
+    os.environ['TZ'] = 'America/New_York'
+    time.tzset()
+
+
+_cold_init()
+
+# Date helpers resolved once at import, so per-call code does a single global lookup.
+_date_fromiso = datetime.date.fromisoformat
+_timedelta = datetime.timedelta
+
+
+# --- Reference data, built once per execution environment ---
+
+
+_CAR_TYPES = frozenset({'economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury', 'economico', 'mediano', 'lujo'})
+_VALID_CITIES = frozenset({'nueva york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
+                           'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
+                           'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
+                           'memphis', 'boston', 'nashville', 'baltimore', 'portland'})
+
+# Car types that have a price tier, in increasing order of cost.
+_CAR_TYPES_PRICED = ('economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury')
+_CAR_TYPE_INDEX = {t: i for i, t in enumerate(_CAR_TYPES_PRICED)}
+
+# Valid room types, mapped to their price tier.
+_ROOM_INDEX = {'queen': 0, 'king': 1, 'deluxe': 2}
 
 
 # --- Helpers that build all of the responses ---
 
 
+# Shared by every response.  Nothing in this module edits a timeToLive in place, so the same dict can be returned each time.
+_TTL_TEMPLATE = {'timeToLiveInSeconds': 600, 'turnsToLive': 1}
+
+
+def _wrap_ctx(attrs):
+    """
+    Wrap context attributes in the single intentContext entry returned in activeContexts.
+    """
+    return [{
+        'name': 'intentContext',
+        'contextAttributes': attrs,
+        'timeToLive': _TTL_TEMPLATE
+    }]
+
+
 def elicit_slot(session_attributes, active_contexts, intent, slot_to_elicit, message):
     return {
         'sessionState': {
-            'activeContexts':[{
-                'name': 'intentContext',
-                'contextAttributes': active_contexts,
-                'timeToLive': {
-                    'timeToLiveInSeconds': 600,
-                    'turnsToLive': 1
-                }
-            }],
+            'activeContexts': _wrap_ctx(active_contexts),
             'sessionAttributes': session_attributes,
             'dialogAction': {
                 'type': 'ElicitSlot',
@@ -79,14 +125,7 @@ def confirm_intent(active_contexts, session_attributes, intent, message):
 def close(session_attributes, active_contexts, fulfillment_state, intent, message):
     response = {
         'sessionState': {
-            'activeContexts':[{
-                'name': 'intentContext',
-                'contextAttributes': active_contexts,
-                'timeToLive': {
-                    'timeToLiveInSeconds': 600,
-                    'turnsToLive': 1
-                }
-            }],
+            'activeContexts': _wrap_ctx(active_contexts),
             'sessionAttributes': session_attributes,
             'dialogAction': {
                 'type': 'Close',
@@ -102,14 +141,7 @@ def close(session_attributes, active_contexts, fulfillment_state, intent, messag
 def delegate(session_attributes, active_contexts, intent, message):
     return {
         'sessionState': {
-            'activeContexts':[{
-                'name': 'intentContext',
-                'contextAttributes': active_contexts,
-                'timeToLive': {
-                    'timeToLiveInSeconds': 600,
-                    'turnsToLive': 1
-                }
-            }],
+            'activeContexts': _wrap_ctx(active_contexts),
             'sessionAttributes': session_attributes,
             'dialogAction': {
                 'type': 'Delegate',
@@ -149,17 +181,11 @@ def safe_int(n):
     return n
 
 
-def try_ex(value):
+def _slot_val(slot):
     """
-    Call passed in function in try block. If KeyError is encountered return None.
-    This function is intended to be used to safely access dictionary of the Slots section in the payloads.
-    Note that this function would have negative impact on performance.
+    Return the interpreted value of a slot from the Slots section in the payloads, or None if it is not filled.
     """
-
-    if value is not None:
-        return value['value']['interpretedValue']
-    else:
-        return None
+    return slot['value']['interpretedValue'] if slot else None
 
 
 def generate_car_price(location, days, age, car_type):
@@ -168,17 +194,15 @@ def generate_car_price(location, days, age, car_type):
     The price is fixed for a given pair of locations.
     """
 
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    base_location_cost = 0
-    for i in range(len(location)):
-        base_location_cost += ord(location.lower()[i]) - 97
+    loc = location.lower()
+    base_location_cost = sum(map(ord, loc)) - 97 * len(loc)
 
     age_multiplier = 1.10 if age < 25 else 1
     # Select economy is car_type is not found
-    if car_type not in car_types:
-        car_type = car_types[0]
+    if car_type not in _CAR_TYPE_INDEX:
+        car_type = _CAR_TYPES_PRICED[0]
 
-    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
+    return days * ((100 + base_location_cost) + ((_CAR_TYPE_INDEX[car_type.lower()] * 50) * age_multiplier))
 
 
 def generate_hotel_price(location, nights, room_type):
@@ -187,50 +211,52 @@ def generate_hotel_price(location, nights, room_type):
     The price is fixed for a pair of location and roomType.
     """
 
-    room_types = ['queen', 'king', 'deluxe']
-    cost_of_living = 0
-    for i in range(len(location)):
-        cost_of_living += ord(location.lower()[i]) - 97
+    loc = location.lower()
+    cost_of_living = sum(map(ord, loc)) - 97 * len(loc)
 
-    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
+    # Price as a queen room if room_type is not found
+    return nights * (100 + cost_of_living + (100 + _ROOM_INDEX.get(room_type.lower(), 0)))
 
 
 def isvalid_car_type(car_type):
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury', 'economico', 'mediano', 'lujo']
-    return car_type.lower() in car_types
+    return car_type.lower() in _CAR_TYPES
 
 
 def isvalid_city(city):
-    valid_cities = ['nueva york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
-                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
-                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
-                    'memphis', 'boston', 'nashville', 'baltimore', 'portland']
-    return city.lower() in valid_cities
+    return city.lower() in _VALID_CITIES
 
 
 def isvalid_room_type(room_type):
-    room_types = ['queen', 'king', 'deluxe']
-    return room_type.lower() in room_types
+    return room_type.lower() in _ROOM_INDEX
+
+
+def parse_date(date):
+    """
+    Parse a date slot value. Lex resolves dates to ISO (YYYY-MM-DD), so try that fast path first and
+    only fall back to dateutil for other formats. Raises ValueError if the value is not a date.
+    """
+    try:
+        return _date_fromiso(date)
+    except ValueError:
+        # dateutil is only needed for non-ISO input, so keep it out of the cold start.
+        import dateutil.parser
+        return dateutil.parser.parse(date).date()
 
 
 def isvalid_date(date):
     try:
-        dateutil.parser.parse(date)
+        parse_date(date)
         return True
     except ValueError:
         return False
 
 
 def get_day_difference(later_date, earlier_date):
-    later_datetime = dateutil.parser.parse(later_date).date()
-    earlier_datetime = dateutil.parser.parse(earlier_date).date()
-    return abs(later_datetime - earlier_datetime).days
+    return abs((parse_date(later_date) - parse_date(earlier_date)).days)
 
 
 def add_days(date, number_of_days):
-    new_date = dateutil.parser.parse(date).date()
-    new_date += datetime.timedelta(days=number_of_days)
-    return new_date.strftime('%Y-%m-%d')
+    return (parse_date(date) + _timedelta(days=number_of_days)).isoformat()
 
 
 def build_validation_result(isvalid, violated_slot, message_content):
@@ -243,11 +269,12 @@ def build_validation_result(isvalid, violated_slot, message_content):
 
 
 def validate_book_car(slots):
-    pickup_city = try_ex(slots['PickUpCity'])
-    pickup_date = try_ex(slots['PickUpDate'])
-    return_date = try_ex(slots['ReturnDate'])
-    driver_age = safe_int(try_ex(slots['DriverAge']))
-    car_type = try_ex(slots['CarType'])
+    today = datetime.date.today()
+    pickup_city = _slot_val(slots.get('PickUpCity'))
+    pickup_date = _slot_val(slots.get('PickUpDate'))
+    return_date = _slot_val(slots.get('ReturnDate'))
+    driver_age = safe_int(_slot_val(slots.get('DriverAge')))
+    car_type = _slot_val(slots.get('CarType'))
 
     if pickup_city and not isvalid_city(pickup_city):
         return build_validation_result(
@@ -259,7 +286,7 @@ def validate_book_car(slots):
     if pickup_date:
         if not isvalid_date(pickup_date):
             return build_validation_result(False, 'PickUpDate', 'I did not understand your departure date.  When would you like to pick up your car rental?')
-        if datetime.datetime.strptime(pickup_date, '%Y-%m-%d').date() <= datetime.date.today():
+        if parse_date(pickup_date) <= today:
             return build_validation_result(False, 'PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
     else:
         return build_validation_result(
@@ -279,7 +306,7 @@ def validate_book_car(slots):
         )
 
     if pickup_date and return_date:
-        if dateutil.parser.parse(pickup_date) >= dateutil.parser.parse(return_date):
+        if parse_date(pickup_date) >= parse_date(return_date):
             return build_validation_result(False, 'ReturnDate', 'Your return date must be after your pick up date.  Can you try a different return date?')
 
         if get_day_difference(pickup_date, return_date) > 30:
@@ -317,10 +344,11 @@ def validate_book_car(slots):
 
 
 def validate_hotel(slots):
-    location = try_ex(slots['Location'])
-    checkin_date = try_ex(slots['CheckInDate'])
-    nights = safe_int(try_ex(slots['Nights']))
-    room_type = try_ex(slots['RoomType'])
+    today = datetime.date.today()
+    location = _slot_val(slots.get('Location'))
+    checkin_date = _slot_val(slots.get('CheckInDate'))
+    nights = safe_int(_slot_val(slots.get('Nights')))
+    room_type = _slot_val(slots.get('RoomType'))
 
     if location is not None and not isvalid_city(location):
         return build_validation_result(
@@ -332,7 +360,7 @@ def validate_hotel(slots):
     if checkin_date is not None:
         if not isvalid_date(checkin_date):
             return build_validation_result(False, 'CheckInDate', 'I did not understand your check in date.  When would you like to check in?')
-        if datetime.datetime.strptime(checkin_date, '%Y-%m-%d').date() <= datetime.date.today():
+        if parse_date(checkin_date) <= today:
             return build_validation_result(False, 'CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
     else:
         return build_validation_result(
@@ -379,68 +407,69 @@ def book_hotel(intent_request):
     2) Use of sessionAttributes to pass information that can be used to guide conversation
     """
 
-    intent = intent_request['sessionState']['intent']
+    session_state = intent_request['sessionState']
+    intent = session_state['intent']
+    slots = intent['slots']
     
     session_attributes = {}
     session_attributes['sessionId'] = intent_request['sessionId']
     
     active_contexts = {}
     
-    confirmation_status = intent_request['sessionState']['intent']['confirmationState']
-
-    # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-    validation_result = validate_hotel(intent_request['sessionState']['intent']['slots'])
-    if not validation_result['isValid']:
-        slots = intent_request['sessionState']['intent']['slots']
-        slots[validation_result['violatedSlot']] = None
-
-        return elicit_slot(
-            session_attributes,
-            active_contexts,
-            intent_request['sessionState']['intent'],
-            validation_result['violatedSlot'],
-            validation_result['message']
-        )
+    confirmation_status = intent['confirmationState']
 
-    # Otherwise, let native DM rules determine how to elicit for slots and prompt for confirmation.  Pass price
-    # back in sessionAttributes once it can be calculated; otherwise clear any setting from sessionAttributes.
-    else:
-        location = try_ex(intent_request['sessionState']['intent']['slots']['Location'])
-        checkin_date = try_ex(intent_request['sessionState']['intent']['slots']['CheckInDate'])
-        nights = safe_int(try_ex(intent_request['sessionState']['intent']['slots']['Nights']))
-        room_type = try_ex(intent_request['sessionState']['intent']['slots']['RoomType'])
-        
-        if location and checkin_date and nights and room_type:
-            # Load confirmation history and track the current reservation.
-            reservation = json.dumps({
-                'ReservationType': 'Hotel',
-                'Location': location,
-                'RoomType': room_type,
-                'CheckInDate': checkin_date,
-                'Nights': nights
-            })
-            
-            active_contexts['ReservationType'] = 'Hotel'
-            active_contexts['Location'] = location
-            active_contexts['RoomType'] = room_type
-            active_contexts['CheckInDate'] = checkin_date
-            active_contexts['Nights'] = nights
-            # The price of the hotel has yet to be confirmed.
-            price = generate_hotel_price(location, nights, room_type)
-            session_attributes['currentReservationPrice'] = price
-        
-            if confirmation_status == 'None':
-                return delegate(session_attributes, active_contexts, intent, 'Confirm hotel reservation')
-
-            elif confirmation_status == 'Confirmed':
-                # Booking the hotel.  In a real application, this would likely involve a call to a backend service.
-                logger.debug('bookHotel under={}'.format(reservation))
-                intent['confirmationState']="Confirmed"
-                intent['state']="Fulfilled"
-                return close(session_attributes, active_contexts, 'Fulfilled', intent,
-                    'Tu reservación de hotel ha quedado registrada. ¿Te puedo ayudar con algo más?'
-                    #'Thanks, I have placed your reservation.   Please let me know if you would like to book a car, rental, or another hotel.'
-                )
+    if intent_request['invocationSource'] == 'DialogCodeHook':
+        # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
+        validation_result = validate_hotel(slots)
+        if not validation_result['isValid']:
+            slots[validation_result['violatedSlot']] = None
+
+            return elicit_slot(
+                session_attributes,
+                active_contexts,
+                intent,
+                validation_result['violatedSlot'],
+                validation_result['message']
+            )
+
+    # The slots are valid (or this is a fulfillment invocation), so let native DM rules determine how to elicit
+    # for slots and prompt for confirmation.  Pass price back in sessionAttributes once it can be calculated.
+    location = _slot_val(slots.get('Location'))
+    checkin_date = _slot_val(slots.get('CheckInDate'))
+    nights = safe_int(_slot_val(slots.get('Nights')))
+    room_type = _slot_val(slots.get('RoomType'))
+    
+    if location and checkin_date and nights and room_type:
+        # Track the current reservation.
+        active_contexts['ReservationType'] = 'Hotel'
+        active_contexts['Location'] = location
+        active_contexts['RoomType'] = room_type
+        active_contexts['CheckInDate'] = checkin_date
+        active_contexts['Nights'] = nights
+        # The price of the hotel has yet to be confirmed.
+        price = generate_hotel_price(location, nights, room_type)
+        session_attributes['currentReservationPrice'] = price
+    
+        if confirmation_status == 'None':
+            return delegate(session_attributes, active_contexts, intent, 'Confirm hotel reservation')
+
+        elif confirmation_status == 'Confirmed':
+            # Booking the hotel.  In a real application, this would likely involve a call to a backend service.
+            if logger.isEnabledFor(logging.DEBUG):
+                reservation = json.dumps({
+                    'ReservationType': 'Hotel',
+                    'Location': location,
+                    'RoomType': room_type,
+                    'CheckInDate': checkin_date,
+                    'Nights': nights
+                })
+                logger.debug('bookHotel under=%s', reservation)
+            intent['confirmationState']="Confirmed"
+            intent['state']="Fulfilled"
+            return close(session_attributes, active_contexts, 'Fulfilled', intent,
+                'Tu reservación de hotel ha quedado registrada. ¿Te puedo ayudar con algo más?'
+                #'Thanks, I have placed your reservation.   Please let me know if you would like to book a car, rental, or another hotel.'
+            )
 
    
 
@@ -452,32 +481,24 @@ def book_car(intent_request):
     2) Use of sessionAttributes to pass information that can be used to guide conversation
     """
     logger.debug('bookCar intent')
-    slots = intent_request['sessionState']['intent']['slots']
-    pickup_city = try_ex(slots['PickUpCity'])
-    pickup_date = try_ex(slots['PickUpDate'])
-    return_date = try_ex(slots['ReturnDate'])
-    driver_age = try_ex(slots['DriverAge'])
-    car_type = try_ex(slots['CarType'])
-    confirmation_status = intent_request['sessionState']['intent']['confirmationState']
-    session_attributes = intent_request['sessionState'].get("sessionAttributes") or {}
-    intent = intent_request['sessionState']['intent']
+    session_state = intent_request['sessionState']
+    intent = session_state['intent']
+    slots = intent['slots']
+    pickup_city = _slot_val(slots.get('PickUpCity'))
+    pickup_date = _slot_val(slots.get('PickUpDate'))
+    return_date = _slot_val(slots.get('ReturnDate'))
+    driver_age = _slot_val(slots.get('DriverAge'))
+    car_type = _slot_val(slots.get('CarType'))
+    confirmation_status = intent['confirmationState']
+    session_attributes = session_state.get("sessionAttributes") or {}
     active_contexts = {}
 
     logger.debug(confirmation_status)
-    # Load confirmation history and track the current reservation.
-    reservation = {
-        'ReservationType': 'Car',
-        'PickUpCity': pickup_city,
-        'PickUpDate': pickup_date,
-        'ReturnDate': return_date,
-        'DriverAge': driver_age,
-        'CarType': car_type
-    }
     
     if intent_request['invocationSource'] == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
         logger.debug('calling validate_book_car')
-        validation_result = validate_book_car(intent_request['sessionState']['intent']['slots'])
+        validation_result = validate_book_car(slots)
         if not validation_result['isValid']:
             if validation_result['violatedSlot'] == 'DriverAge' and confirmation_status == 'Denied':
                 validation_result['violatedSlot'] = 'PickUpCity'
@@ -521,6 +542,13 @@ def book_car(intent_request):
 # --- Intents ---
 
 
+# Intent handlers by intent name, used by dispatch to route each request.
+_INTENT_HANDLERS = {
+    'BookHotel': book_hotel,
+    'BookCar': book_car,
+}
+
+
 def dispatch(intent_request):
     """
     Called when the user specifies an intent for this bot.
@@ -528,33 +556,29 @@ def dispatch(intent_request):
     logger.debug(intent_request)
     
     
-    slots = intent_request['sessionState']['intent']['slots']
-    
-    location = slots['Location'] if 'Location' in slots else None
-    pickup_city = slots['PickUpCity'] if 'PickUpCity' in slots else None
-    
-    intent_name = intent_request['sessionState']['intent']['name']
+    session_state = intent_request['sessionState']
+    intent = session_state['intent']
+    slots = intent['slots']
+    intent_name = intent['name']
     
     
     #Ignoring initial invocation, which happens after the first interaction of the end user with the intents in the testing interface
-    if not isinstance(location, type(None)) or  not isinstance(pickup_city, type(None)):
-        logger.debug('dispatch sessionId={}, intentName={}'.format(intent_request['sessionId'], intent_request['sessionState']['intent']['name']))
+    if slots.get('Location') is not None or slots.get('PickUpCity') is not None:
+        logger.debug('dispatch sessionId=%s, intentName=%s', intent_request['sessionId'], intent_name)
 
 
         # Dispatch to your bot's intent handlers
-        if intent_name == 'BookHotel':
-            return book_hotel(intent_request)
-        elif intent_name == 'BookCar':
-            return book_car(intent_request)
+        handler = _INTENT_HANDLERS.get(intent_name)
+        if handler:
+            return handler(intent_request)
 
         raise Exception('Intent with name ' + intent_name + ' not supported')
         
     #If the user is asking to reserve a car, and there are active session attributes from the BookHotel intent, 
     #Lex will try to confirm if the values should be reused
-    elif 'activeContexts' in intent_request['sessionState'] and len(intent_request['sessionState']['activeContexts']):
-        active_contexts = intent_request['sessionState']['activeContexts'][0]
-        session_attributes = intent_request['sessionState']['sessionAttributes']
-        intent = intent_request['sessionState']['intent']
+    elif 'activeContexts' in session_state and len(session_state['activeContexts']):
+        active_contexts = session_state['activeContexts'][0]
+        session_attributes = session_state['sessionAttributes']
         message = 'Indicame si la reservacion de auto es para {PickUpCity}, empezando {PickUpDate} y terminando {ReturnDate}'
         
         logger.debug(message)
@@ -562,7 +586,7 @@ def dispatch(intent_request):
         checkin_date = active_contexts['contextAttributes']['CheckInDate']
         return_date = add_days(checkin_date, safe_int(active_contexts['contextAttributes']['Nights']))
         #return_date = checkin_date + datetime.timedelta(days=safe_int(active_contexts['contextAttributes']['Nights']))
-        active_contexts['timeToLive']['turnsToLive']=20
+        active_contexts['timeToLive'] = dict(active_contexts['timeToLive'], turnsToLive=20)
         
         logger.debug(return_date)
         
@@ -623,8 +647,5 @@ def lambda_handler(event, context):
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
-    # By default, treat the user request as coming from the America/New_York time zone.
-    os.environ['TZ'] = 'America/New_York'
-    time.tzset()
-    #logger.debug('event.bot.name={}'.format(event['bot']['name']))
+    #logger.debug('event.bot.name=%s', event['bot']['name'])
     return dispatch(event)